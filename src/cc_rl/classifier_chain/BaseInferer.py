@@ -1,3 +1,4 @@
+from joblib import Parallel, delayed
 from sklearn.multioutput import ClassifierChain
 
 from nptyping import NDArray
@@ -22,6 +23,12 @@ class BaseInferer:
         assert(loss == 'exact_match' or loss == 'hamming')
         self.loss = loss
 
+        # Cached once here so the hot loops skip the attribute chain and the
+        # inverse order isn't rebuilt on every prediction
+        self._estimators = cc.estimators_
+        self._inv_order = np.empty_like(cc.order_)
+        self._inv_order[cc.order_] = np.arange(len(cc.order_))
+
     def infer(self, x: NDArray[float]):
         """Infers a prediction according to the child inferer algorithm.
 
@@ -79,18 +86,44 @@ class BaseInferer:
         Returns:
             reward (float): Final average reward of that prediction.
         """
+        # Samples with identical features keep identical estimator inputs as the
+        # prediction prefix grows, so each unique row only needs one predict_proba
+        # evaluation. Only worth checking when x itself has duplicate rows.
+        deduplicate = len(np.unique(x, axis=0)) < len(x)
+
+        # Estimator inputs only grow by one prediction column per step, so a single
+        # preallocated buffer replaces one hstack copy per estimator
+        n_estimators = len(self._estimators)
+        buf = np.empty((len(x), x.shape[1] + n_estimators),
+                       dtype=np.result_type(x.dtype, pred.dtype))
+        buf[:, :x.shape[1]] = x
+        buf[:, x.shape[1]:] = pred
+
+        row_idx = np.arange(len(x))
+
+        def score_one(i):
+            x_aug = buf[:, :x.shape[1] + i]
+            if deduplicate:
+                uniq, inverse = np.unique(x_aug, axis=0, return_inverse=True)
+                proba = self._estimators[i].predict_proba(uniq)[inverse]
+            else:
+                proba = self._estimators[i].predict_proba(x_aug)
+            # Gathering each row's column directly avoids the
+            # take_along_axis reshape/flatten roundtrip. float32 is plenty for
+            # probabilities and halves the reduction bandwidth
+            return proba[row_idx, pred[:, i].astype(np.intp)].astype(
+                np.float32, copy=False)
+
+        # Since the prediction is already fixed here, every estimator's gather is
+        # independent of the others. Threads suffice because sklearn releases the
+        # GIL inside the matmul.
+        scores = Parallel(n_jobs=-1, backend='threading')(
+            delayed(score_one)(i) for i in range(n_estimators))
+
         if self.loss == 'exact_match':
-            reward = np.ones((len(x),), dtype=float)
+            reward = np.prod(scores, axis=0)
         else:
-            reward = np.zeros((len(x),), dtype=float)
-
-        for i in range(len(self._cc.estimators_)):
-            x_aug = np.hstack((x, pred[:, :i]))
-            proba = self._cc.estimators_[i].predict_proba(x_aug)
-            reward = self._new_score(
-                reward,
-                np.take_along_axis(
-                    proba, pred[:, i].astype(int).reshape(-1, 1), axis=1).flatten())
+            reward = np.sum(scores, axis=0)
         return reward.mean()
 
     def __fix_order(self, pred: NDArray[float]):
@@ -104,6 +137,4 @@ class BaseInferer:
             np.array: Prediction in the correct order of shape (n,).
         """
 
-        inv_order = np.empty_like(self._cc.order_)
-        inv_order[self._cc.order_] = np.arange(len(self._cc.order_))
-        return pred[:, inv_order]
+        return pred[:, self._inv_order]
@@ -131,11 +131,15 @@ class ClassifierChain:
                 batch_size = kwargs['batch_size'] if 'batch_size' in kwargs else None
                 learning_rate = kwargs['learning_rate'] if 'learning_rate' in kwargs else None
                 mcts_passes = kwargs['mcts_passes'] if 'mcts_passes' in kwargs else None
+                n_jobs = kwargs['n_jobs'] if 'n_jobs' in kwargs else None
+                warm_start = kwargs['warm_start'] if 'warm_start' in kwargs else None
+                epochs_warm = kwargs['epochs_warm'] if 'epochs_warm' in kwargs else None
                 inferer = RLInferer(self, loss,
                                     agent_type=inference_method, nb_sim=kwargs['nb_sim'],
                                     nb_paths=kwargs['nb_paths'], epochs=kwargs['epochs'],
                                     batch_size=batch_size, learning_rate=learning_rate,
-                                    mcts_passes=mcts_passes)
+                                    mcts_passes=mcts_passes, n_jobs=n_jobs,
+                                    warm_start=warm_start, epochs_warm=epochs_warm)
             else:
                 raise Exception('This inference method does not exist.')
 
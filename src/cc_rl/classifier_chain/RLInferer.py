@@ -1,3 +1,4 @@
+from joblib import Parallel, delayed
 from nptyping import NDArray
 import numpy as np
 
@@ -7,6 +8,32 @@ from cc_rl.rl.MCTSAgent import MCTSAgent
 from cc_rl.rl.QAgent import QAgent
 
 
+def _train_one(classifier_chain, xi, agent_type: str, nb_sim: int, nb_paths: int,
+               epochs: int, batch_size: int, learning_rate: float, mcts_passes: int):
+    """Trains an agent on a single sample in its own environment. Module-level so
+    joblib workers can pickle it.
+
+    Args:
+        classifier_chain (ClassifierChain): Chain the environment predicts with.
+        xi (np.array): Single sample of shape (1, d1).
+
+    Returns:
+        np.array: Predicted path for this sample.
+        int: Number of visited nodes during training.
+    """
+
+    env = Env(classifier_chain, xi)
+    if agent_type == 'qlearning':
+        agent = QAgent(env)
+    elif agent_type == 'mcts':
+        agent = MCTSAgent(env, mcts_passes=mcts_passes)
+    else:
+        raise ValueError
+
+    agent.train(nb_sim, nb_paths, epochs, batch_size, learning_rate)
+    return agent.predict(return_num_nodes=True)
+
+
 class RLInferer(BaseInferer):
     """
     Uses RL agents to learn the best inference.
@@ -15,7 +42,8 @@ class RLInferer(BaseInferer):
     def __init__(self, classifier_chain, loss: str,
                  agent_type: str, nb_sim: int, nb_paths: int, epochs: int,
                  batch_size: int = 64, learning_rate: float = 1e-3,
-                 mcts_passes: int = 10):
+                 mcts_passes: int = 10, n_jobs: int = 1, warm_start: bool = False,
+                 epochs_warm: int = None):
         super().__init__(classifier_chain.cc, loss)
         self.cc = classifier_chain
         assert agent_type == 'qlearning' or agent_type == 'mcts'
@@ -26,11 +54,33 @@ class RLInferer(BaseInferer):
         self.__batch_size = batch_size if batch_size is not None else 64
         self.__learning_rate = learning_rate if learning_rate is not None else 1e-3
         self.__mcts_passes = mcts_passes if mcts_passes is not None else 10
+        self.__n_jobs = n_jobs if n_jobs is not None else 1
+        # Successive samples solve very similar MDPs on the same chain, so the agent
+        # network can start from the previous sample's weights and adapt with fewer
+        # epochs. Only used in the sequential path.
+        self.__warm_start = warm_start if warm_start is not None else False
+        if epochs_warm is None:
+            epochs_warm = max(1, epochs // 4)
+        self.__epochs_warm = epochs_warm
 
     def _infer(self, x: NDArray[float]):
+        if self.__n_jobs != 1:
+            # Each sample trains an independent agent, so the loop is embarrassingly
+            # parallel. Every worker builds its own single-sample environment.
+            results = Parallel(n_jobs=self.__n_jobs, backend='loky')(
+                delayed(_train_one)(
+                    self.cc, x[i:i + 1], self.__agent_type, self.__nb_sim,
+                    self.__nb_paths, self.__epochs, self.__batch_size,
+                    self.__learning_rate, self.__mcts_passes)
+                for i in range(len(x)))
+            y_pred = [pred for pred, _ in results]
+            n_nodes = sum(nodes for _, nodes in results)
+            return np.array(y_pred, dtype=bool), n_nodes / len(x)
+
         y_pred = []
         n_nodes = 0
         env = Env(self.cc, x)
+        model_state = None
 
         for i in range(len(x)):
             if self.__agent_type == 'qlearning':
@@ -40,8 +90,16 @@ class RLInferer(BaseInferer):
             else:
                 raise ValueError
 
-            agent.train(self.__nb_sim, self.__nb_paths, self.__epochs,
+            epochs = self.__epochs
+            if model_state is not None:
+                # Fresh agent bookkeeping, warm-started network weights
+                agent.model.load_state_dict(model_state)
+                epochs = self.__epochs_warm
+
+            agent.train(self.__nb_sim, self.__nb_paths, epochs,
                         self.__batch_size, self.__learning_rate)
+            if self.__warm_start:
+                model_state = agent.model.state_dict()
 
             pred = agent.predict(return_num_nodes=True)
             y_pred.append(pred[0])
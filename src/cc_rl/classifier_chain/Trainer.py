@@ -1,13 +1,42 @@
+from joblib import Parallel, delayed
 import numpy as np
 import os
 import pickle
-from sklearn.metrics import brier_score_loss
+from sklearn.linear_model import LogisticRegressionCV
 
 from cc_rl.data.Dataset import Dataset
 from cc_rl.classifier_chain.ClassifierChain import ClassifierChain
 from cc_rl.utils.LogisticRegressionExtended import LogisticRegressionExtended
 
 
+def _fit_position(x, y, Cs):
+    """Fits one chain position, selecting the regularization parameter by cross
+    validation on the training data. Module-level so joblib workers can pickle it.
+
+    LogisticRegressionCV warm-starts along the whole C path, so this costs about
+    one fit instead of one per C. Positions without enough members of each class
+    to cross validate fall back to a plain fit.
+
+    Args:
+        x (np.array): Augmented training data for this chain position.
+        y (np.array): Binary targets of this chain position.
+        Cs (list): Regularization parameters to select from.
+
+    Returns:
+        sklearn.base.BaseEstimator: The fitted estimator.
+    """
+    _, counts = np.unique(y, return_counts=True)
+    if len(counts) < 2 or counts.min() < 2:
+        estimator = LogisticRegressionExtended(solver='liblinear')
+        estimator.fit(x, y)
+        return estimator
+
+    estimator = LogisticRegressionCV(Cs=Cs, cv=min(5, counts.min()),
+                                     scoring='neg_brier_score', solver='liblinear')
+    estimator.fit(x, y)
+    return estimator
+
+
 class Trainer:
     """Performs automatic calibration of the classifier chains internal estimators for
     each dataset and saves it on pickle a file to be loaded later.
@@ -50,8 +79,9 @@ class Trainer:
         """Calibrates the base estimators parameters.
 
         If base_estimator = 'logistic_regression', it will find the best regularization
-        parameter C for each individual binary regressor by perform a grid search over the
-        values [0.001, 0.01, 0.1, 1, 10, 100, 1000] optimizing brier loss. Same strategy
+        parameter C for each individual binary regressor with one LogisticRegressionCV
+        per chain position over the values [0.001, 0.01, 0.1, 1, 10, 100, 1000],
+        optimizing brier loss by cross validation on the training data. Same strategy
         used in MENA et al.
 
         The fit method from sklearn needed to be rewritten because in it the estimators_
@@ -63,38 +93,20 @@ class Trainer:
                              random_state=self.__random_state)
 
         cc.n_labels = self.ds.train_y.shape[1]
-        best_estimators = [None for _ in range(cc.n_labels)]
-        best_score = np.full((cc.n_labels,), np.inf)
-
         cc.cc.order_ = self.best_order
 
-        # FIXME 1: Stop using test_y here, do cv with train instead
         # TODO: Check this out https://www.researchgate.net/publication/220320172_Trust_Region_Newton_Method_for_Logistic_Regression
         if self.__base_estimator == 'logistic_regression':
             x_aug = np.hstack((self.ds.train_x, self.ds.train_y[:, cc.cc.order_]))
-
-            for C in [0.001, 0.01, 0.1, 1, 10, 100, 1000]:
-                cc.cc.estimators_ = [LogisticRegressionExtended(
-                    C=C, solver='liblinear') for _ in range(cc.n_labels)]
-
-                # Fitting them manually to avoid resetting estimators
-                for chain_idx, estimator in enumerate(cc.cc.estimators_):
-                    y = self.ds.train_y[:, cc.cc.order_[chain_idx]]
-                    estimator.fit(
-                        x_aug[:, :(self.ds.train_x.shape[1] + chain_idx)], y)
-
-                pred = cc.cc.predict(self.ds.test_x)
-                score = np.array([brier_score_loss(self.ds.test_y[:, i], pred[:, i])
-                                  for i in range(cc.n_labels)])
-                score = score[cc.cc.order_]
-
-                change = score < best_score
-                best_score[change] = score[change]
-                for i in range(len(change)):
-                    if change[i]:
-                        best_estimators[i] = cc.cc.estimators_[i]
-
-            cc.cc.estimators_ = best_estimators
+            Cs = [0.001, 0.01, 0.1, 1, 10, 100, 1000]
+            n_features = self.ds.train_x.shape[1]
+
+            # One cross-validated fit per chain position, in parallel. Fitting
+            # manually instead of cc.fit to avoid resetting estimators.
+            cc.cc.estimators_ = Parallel(n_jobs=-1, backend='loky')(
+                delayed(_fit_position)(x_aug[:, :(n_features + chain_idx)],
+                                       self.ds.train_y[:, cc.cc.order_[chain_idx]], Cs)
+                for chain_idx in range(cc.n_labels))
         else:
             cc.cc.fit(self.ds.train_x, self.ds.train_y)
 
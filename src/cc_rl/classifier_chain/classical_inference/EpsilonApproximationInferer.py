@@ -3,11 +3,52 @@ import numpy as np
 from cc_rl.classifier_chain.BaseInferer import BaseInferer
 
 
+def _expand_level(rows, preds, scores, proba, i, epsilon, exact_match):
+    """Bookkeeping for one tree level of the epsilon approximation search, separated
+    from the predict_proba call so it only works on typed arrays.
+
+    Builds the next active set from the current one: the child with highest
+    probability is always kept, the other one only if its score passes epsilon.
+
+    Args:
+        rows (np.array): Sample row of each active node, shape (k,).
+        preds (np.array): Partial predictions of the active nodes, shape (k, d2).
+        scores (np.array): Accumulated scores of the active nodes, shape (k,).
+        proba (np.array): Estimator probabilities for the active nodes, shape (k, 2).
+        i (int): Index of the current estimator.
+        epsilon (float): Pruning threshold.
+        exact_match (bool): If the loss is 'exact_match' instead of 'hamming'.
+
+    Returns:
+        tuple: (rows, preds, scores) of the next level's active set.
+    """
+
+    p0 = proba[:, 0]
+    p1 = proba[:, 1]
+    high_k = p1 > p0
+    low_k = p0 > p1
+    if exact_match:
+        high_scores = scores * np.maximum(p0, p1)
+        low_scores = scores * np.minimum(p0, p1)
+    else:
+        high_scores = scores + np.maximum(p0, p1)
+        low_scores = scores + np.minimum(p0, p1)
+    keep = low_scores >= epsilon
+
+    n_high = len(rows)
+    rows = np.concatenate((rows, rows[keep]))
+    preds = np.concatenate((preds, preds[keep]))
+    preds[:n_high, i] = high_k
+    preds[n_high:, i] = low_k[keep]
+    scores = np.concatenate((high_scores, low_scores[keep]))
+    return rows, preds, scores
+
+
 class EpsilonApproximationInferer(BaseInferer):
     """Inferer that expands the tree in only selected nodes, where the joint probability
     is more than epsilon. Complexity O(d / epsilon).
 
-    This inferer is equivalent to greedy if epsilon >= 0.5 and equialent to exhaustive 
+    This inferer is equivalent to greedy if epsilon >= 0.5 and equialent to exhaustive
     search if epsilon = 0.
     """
 
@@ -29,6 +70,11 @@ class EpsilonApproximationInferer(BaseInferer):
     def _infer(self, x):
         """Infers prediction by expanding the search in only selected nodes.
 
+        Instead of recursing over the tree branches, the search keeps an active set of
+        (sample row, partial prediction) pairs and expands one level at a time, so each
+        estimator's predict_proba is called exactly once per level with all active nodes
+        stacked together.
+
         Args:
             x (np.array): Prediction data of shape (n, d1).
 
@@ -37,58 +83,61 @@ class EpsilonApproximationInferer(BaseInferer):
             int: The average number of visited nodes in the tree search.
         """
 
-        cur_pred = np.zeros((len(x), len(self.cc.estimators_)), dtype=bool)
-        cur_p = np.ones((len(x),))
-        mask = np.ones((len(x),), dtype=bool)
-        self.__best_pred = np.copy(cur_pred)
-        self.__best_p = np.zeros((len(x),))
-
-        self.__n_nodes = 0
-        self.__dfs(x, cur_pred, cur_p, 0, mask)
-        self.__n_nodes = self.__n_nodes / len(x)
-
-        return self.__best_pred, self.__n_nodes
-
-    def __dfs(self, x, cur_pred, cur_p, i, mask):
-        """Searches through the tree in a dfs. This is vectorized, so it is done at the
-        same time for every row of x.
-
-        Args:
-            x (np.array): Prediction data of shape (n, d1)
-            cur_pred (np.array): Current prediction in the recursion of shape (n, d2)
-            cur_p (np.array): Current accumulated probability in the recursion of shape 
-                (n,)
-            i (int): Index of the current estimator in the recursion.
-            mask (np.array): Mask with the current rows that are being analyzed. Since in
-                this algorithm there is a condition a node must pass to be visited, in
-                some rows of the dataset the search may stop at some point while in others
-                it will continue.
-        """
-
-        if i == len(self.cc.estimators_):
-            change = np.copy(mask)
-            change[mask] = cur_p > self.__best_p[mask]
-            self.__best_pred[change] = cur_pred[change]
-            self.__best_p[change] = cur_p[change[mask]]
-        else:
-            x_aug = np.hstack((x[mask], cur_pred[mask, :i]))
-            proba = self.cc.estimators_[i].predict_proba(x_aug)
-            self.__n_nodes += np.count_nonzero(mask)
-
-            # The node with highest proba will always be visited
-            proba_max = self._new_score(cur_p, np.max(proba, axis=1))
-            k = np.argmax(proba, axis=1)
-            cur_pred[mask, i] = k.astype(bool)
-            self.__dfs(x, cur_pred, proba_max, i+1, mask)
-
-            # The node with lowest proba has to pass a condition to be visited
-            proba_min = self._new_score(cur_p, np.min(proba, axis=1))
-            condition = proba_min >= self.epsilon
-            new_mask = np.copy(mask)
-            new_mask[new_mask] = condition
-
-            if np.count_nonzero(new_mask) > 0:
-                k = np.argmin(proba[condition], axis=1)
-                cur_pred[new_mask, i] = k.astype(bool)
-                proba_min = proba_min[condition]
-                self.__dfs(x, cur_pred, proba_min, i+1, new_mask)
+        n = len(x)
+        d2 = len(self.cc.estimators_)
+        best_pred = np.zeros((n, d2), dtype=bool)
+        best_p = np.zeros((n,), dtype=np.float32)
+
+        # Active set: one entry per node visited at the current level. Scores are
+        # float32: probabilities don't need double precision and the smaller dtype
+        # halves the traffic through the score updates
+        rows = np.arange(n)
+        preds = np.zeros((n, d2), dtype=bool)
+        scores = np.ones((n,), dtype=np.float32)
+        n_nodes = 0
+
+        # Duplicate feature rows keep producing duplicate (features, prefix) nodes
+        # while the tree expands, so each unique row only needs one predict_proba
+        # evaluation. Only worth checking when x itself has duplicate rows.
+        deduplicate = len(np.unique(x, axis=0)) < len(x)
+
+        # Reusable buffer for the estimator inputs, grown geometrically with the
+        # active set so each level gathers into it instead of allocating an hstack
+        d1 = x.shape[1]
+        buf = np.empty((2 * n, d1 + d2), dtype=x.dtype)
+
+        for i in range(d2):
+            k = len(rows)
+            if len(buf) < k:
+                buf = np.empty((2 * k, d1 + d2), dtype=x.dtype)
+            np.take(x, rows, axis=0, out=buf[:k, :d1])
+            buf[:k, d1:d1 + i] = preds[:, :i]
+            x_aug = buf[:k, :d1 + i]
+            proba = None
+            if deduplicate:
+                uniq, inverse = np.unique(x_aug, axis=0, return_inverse=True)
+                # Guard against paying the gather cost when rows barely compress
+                if len(uniq) < 0.7 * len(x_aug):
+                    proba = self.cc.estimators_[i].predict_proba(uniq)[inverse]
+            if proba is None:
+                proba = self.cc.estimators_[i].predict_proba(x_aug)
+            proba = proba.astype(np.float32, copy=False)
+            n_nodes += len(rows)
+
+            rows, preds, scores = _expand_level(
+                rows, preds, scores, proba, i, self.epsilon,
+                self.loss == 'exact_match')
+
+        # Keep the best complete path of each sample. Sorting by (row, score) puts the
+        # best entry of every sample last in its group.
+        order = np.lexsort((scores, rows))
+        rows = rows[order]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+        sel = order[last]
+
+        change = scores[sel] > best_p[rows[last]]
+        best_pred[rows[last][change]] = preds[sel][change]
+        best_p[rows[last][change]] = scores[sel][change]
+
+        return best_pred, n_nodes / n
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import gym
 from gym import spaces
 import numpy as np
@@ -16,6 +17,11 @@ class Env(gym.Env):
   You only receive a reward in the end and it corresponds to the final 
   joint probability
   '''
+  # Largest number of labels for which the whole observation tree is precomputed
+  precompute_max_labels = 12
+  # Maximum number of entries kept in the observation cache
+  observation_cache_size = 100000
+
   def __init__(self, classifier_chain, x, loss='exact_match', display=None,
                random_seed=42):
     '''
@@ -33,17 +39,50 @@ class Env(gym.Env):
     self.loss = loss
     self.action_space = [-1, 1]
 
-    self.path = np.zeros((classifier_chain.n_labels,), dtype=int)
-    self.probabilities = np.zeros((classifier_chain.n_labels,), dtype=float)
+    self.path = np.zeros((classifier_chain.n_labels,), dtype=np.int8)
+    self.probabilities = np.zeros((classifier_chain.n_labels,), dtype=np.float32)
+    # When True, non-terminal step/reset returns hand out views of path and
+    # probabilities instead of copies. Callers must consume them before the next
+    # step or copy themselves
+    self.return_views = False
     self.obs = None
+    self.obs_log = None
     self.current_estimator = 0
     self.current_probability = 1
     self.x = x
     self.cur_sample = 0
     self.cur_x = self.x[self.cur_sample]
-    self.observation_dict = {}
+    # LRU cache of observations shared across samples, keyed by
+    # (sample, estimator, path bits) and bounded by observation_cache_size
+    self.observation_dict = OrderedDict()
+    # Bitmask with bit i set when path[i] == 1, kept incrementally so the
+    # observation cache key is a pair of ints instead of an O(d) tuple
+    self.path_bits = 0
+
+    # For small trees the whole set of 2^d observations is cheap to batch in one
+    # predict_proba call per estimator, amortizing sklearn overhead over all the
+    # rollouts of the RL agents
+    self.proba_table = None
+    if classifier_chain.n_labels <= Env.precompute_max_labels:
+      self.precompute_tree()
 
     self.renderer = Renderer(display, classifier_chain.n_labels + 1, loss=loss)
+    # Rendering disabled means step can skip the renderer call entirely
+    self._render = display is not None
+
+  def precompute_tree(self):
+    '''
+    Precomputes the observations of every node in the tree for the current sample,
+    one batched predict_proba call per estimator over all its 2^i prefixes. After
+    this, _next_observation becomes a table lookup
+    '''
+    self.proba_table = []
+    for i in range(self.classifier_chain.n_labels):
+      prefixes = ((np.arange(1 << i).reshape(-1, 1) >> np.arange(i)) & 1).astype(bool)
+      xy = np.hstack((np.tile(self.cur_x, ((1 << i), 1)), prefixes))
+      proba = self.classifier_chain.cc.estimators_[i].predict_proba(xy)
+      with np.errstate(divide='ignore'):
+        self.proba_table.append((proba, np.log(proba)))
 
   def _next_observation(self):
     '''
@@ -51,13 +90,26 @@ class Env(gym.Env):
     '''
     self.current_estimator += 1
 
-    path_tuple = tuple(self.path)
-    if path_tuple in self.observation_dict:
-      return self.observation_dict[path_tuple]
+    if self.proba_table is not None:
+      proba, log_proba = self.proba_table[self.current_estimator]
+      self.obs_log = log_proba[self.path_bits]
+      return proba[self.path_bits]
+
+    key = (self.cur_sample, self.current_estimator, self.path_bits)
+    if key in self.observation_dict:
+      self.observation_dict.move_to_end(key)
+      obs, self.obs_log = self.observation_dict[key]
+      return obs
     else:
       xy = np.append(self.cur_x, (self.path[:self.current_estimator] + 1).astype(bool))
       obs = self.classifier_chain.cc.estimators_[self.current_estimator].predict_proba(xy.reshape(1,-1)).flatten()
-      self.observation_dict[path_tuple] = obs
+      # Log-probabilities are precomputed once per observation so step doesn't pay
+      # one np.log call per transition
+      with np.errstate(divide='ignore'):
+        self.obs_log = np.log(obs)
+      self.observation_dict[key] = (obs, self.obs_log)
+      if len(self.observation_dict) > Env.observation_cache_size:
+        self.observation_dict.popitem(last=False)
       return obs
 
   def step(self, action):
@@ -77,26 +129,38 @@ class Env(gym.Env):
     if action != 1 and action != -1:
       raise RuntimeError("Action " + str(action) + " not acceptable." + " It should be 1 or -1.")
 
+    # Locals cut repeated attribute lookups in the hottest method of the RL loop
+    estimator = self.current_estimator
+    obs = self.obs
+
     # append last observation
-    self.path[self.current_estimator] = action
+    self.path[estimator] = action
+    if action == 1:
+      self.path_bits |= 1 << estimator
 
-    # We append the last chosen probability    
-    self.probabilities[self.current_estimator] = self.obs[0]
+    # We append the last chosen probability
+    self.probabilities[estimator] = obs[0]
 
-    prob = self.obs[(action + 1) // 2]
+    chosen = (action + 1) // 2
+    prob = obs[chosen]
+    # float() keeps the accumulator a Python float; otherwise the numpy scalar
+    # contaminates every following addition with numpy dispatch overhead
     if self.loss == 'exact_match':
-      self.current_probability += np.log(prob)
+      self.current_probability += float(self.obs_log[chosen])
     else:
-      self.current_probability += prob
-    self.renderer.step(action, prob)
+      self.current_probability += float(prob)
+    if self._render:
+      self.renderer.step(action, prob)
 
-    if self.current_estimator == self.classifier_chain.n_labels - 1:
+    if estimator == self.classifier_chain.n_labels - 1:
       return None, self.path.copy(), self.probabilities.copy(), \
              self.current_probability, True
 
     else:
       # Take new observation
       self.obs = self._next_observation()
+      if self.return_views:
+        return self.obs[0], self.path, self.probabilities, 0, False
       return self.obs[0], self.path.copy(), self.probabilities.copy(), 0, False
 
   def reset(self, label=0):
@@ -113,14 +177,15 @@ class Env(gym.Env):
 
     probs = np.abs(((1 + self.path) // 2 - self.probabilities))[:label]
     if self.loss == 'exact_match':
-      self.current_probability = np.sum(np.log(probs))
+      self.current_probability = float(np.sum(np.log(probs)))
     else:
-      self.current_probability = np.sum(probs)
+      self.current_probability = float(np.sum(probs))
     #self.current_probability = np.prod(self.probabilities[:label])
     
     # Update path and probabilities
     self.path[label:] = 0
     self.probabilities[label:] = 0
+    self.path_bits &= (1 << label) - 1
 
     self.renderer.reset(label)
 
@@ -128,11 +193,14 @@ class Env(gym.Env):
     self.current_estimator = label - 1
     self.obs = self._next_observation()
 
+    if self.return_views:
+      return self.obs[0], self.path, self.probabilities
     return self.obs[0], self.path.copy(), self.probabilities.copy()
   
   def next_sample(self):
     self.cur_sample += 1
     self.cur_x = self.x[self.cur_sample]
-    self.observation_dict = {}
+    if self.proba_table is not None:
+      self.precompute_tree()
     self.reset()
     self.renderer.next_sample()
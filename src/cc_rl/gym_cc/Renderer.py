@@ -1,7 +1,6 @@
 import numpy as np
 import os
-
-from .RendererNode import RendererNode
+import time
 
 # Pygame needs adjustment before import if in notebook
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
@@ -54,16 +53,35 @@ class Renderer:
             self.__font = pygame.font.SysFont('helvetica', self.constants['font_size'])
             self.__clock = pygame.time.Clock()
 
+            # Probabilities are displayed rounded to one decimal, so only 11
+            # label strings are possible; rendering them here once takes
+            # font.render out of the draw hot path
+            self.__text_cache = {}
+            for i in range(11):
+                text = '{:.1f}'.format(i / 10)
+                self.__text_cache[text] = self.__font.render(
+                    text, False, Renderer.colors['font']).convert_alpha()
+
             # Setup tree
-            self.__root = RendererNode(np.array([0.5, 0]))
-            self.__cur_node = self.__root
+            self.__init_tree()
             self.__cur_actions = []
             self.__best_actions = []
+            # View or best-path changes invalidate the whole screen; a plain
+            # step only repaints and flips the damaged rects
+            self.__needs_full_redraw = True
 
             # Setup view
             self.__translation = np.zeros(2, dtype=int)
             self.__scale = 1.
             self.__is_panning = False
+            # Screen coordinates are cached between frames; the epoch is bumped
+            # whenever the view changes and invalidates the whole cache
+            self.__view_epoch = 0
+            self.__screen = []
+            self.__screen_epoch = -1
+            # Event pumping is throttled to the display framerate, so callers
+            # stepping faster than fps don't pay the queue drain every call
+            self.__last_pump = -np.inf
 
     def step(self, action: int, probability: float):
         """
@@ -92,7 +110,8 @@ class Renderer:
         """
         assert label <= self.__depth - 1
 
-        if (self.__mode == 'draw' and self.__cur_node.depth == self.__depth - 1) or \
+        if (self.__mode == 'draw' and
+            self.__node_depth[self.__cur_node] == self.__depth - 1) or \
                 (self.__mode == 'print' and label == 0):
             # Update best path
             if self.__cur_reward > self.__best_reward and self.__cur_reward != 0:
@@ -108,11 +127,14 @@ class Renderer:
             # Walk from root to label
             self.__cur_actions = self.__cur_actions[:label]
 
-            self.__cur_node = self.__root
+            self.__cur_node = 0
             for i in range(label):
-                self.__cur_node = self.__cur_node[self.__cur_actions[i]]
-                self.__cur_reward *= self.__cur_node.p
+                self.__cur_node = int(
+                    self.__node_children[self.__cur_node, self.__cur_actions[i]])
+                self.__cur_reward *= self.__node_p[self.__cur_node]
 
+            # The current node jumped and the best path may have changed
+            self.__needs_full_redraw = True
             self.__draw()
 
     def next_sample(self):
@@ -125,12 +147,58 @@ class Renderer:
         self.__cur_actions = []
 
         if self.__mode == 'draw':
-            RendererNode.id_counter = 0
-            self.__root = RendererNode(np.array([0.5, 0]))
-            self.__cur_node = self.__root
+            self.__init_tree()
             self.__translation = np.zeros(2, dtype=int)
             self.__scale = 1.
             self.__is_panning = False
+            self.__needs_full_redraw = True
+            self.__view_epoch += 1
+
+    def __init_tree(self):
+        """
+        Starts the node arrays over with only the root. Nodes are stored as parallel
+        arrays indexed by node id, with -1 in children marking a missing child.
+        """
+        initial = 64
+        self.__node_coords = np.empty((initial, 2))
+        self.__node_children = np.full((initial, 2), -1, dtype=np.int32)
+        self.__node_p = np.ones(initial)
+        self.__node_depth = np.zeros(initial, dtype=np.int32)
+        self.__node_coords[0] = (0.5, 0.)
+        self.__n_nodes = 1
+        self.__cur_node = 0
+        self.__prev_node = None
+
+    def __add_node(self, parent: int, a: int, probability: float) -> int:
+        """
+        Appends the child of parent on side a to the node arrays, growing them
+        geometrically when full.
+        @param parent: Index of the parent node.
+        @param a: 0 for the left child, 1 for the right one.
+        @param probability: Probability of the action leading to the new node.
+        @return: Index of the new node.
+        """
+        n = self.__n_nodes
+        if n == len(self.__node_coords):
+            self.__node_coords = np.concatenate(
+                (self.__node_coords, np.empty_like(self.__node_coords)))
+            self.__node_children = np.concatenate(
+                (self.__node_children, np.full_like(self.__node_children, -1)))
+            self.__node_p = np.concatenate((self.__node_p,
+                                            np.empty_like(self.__node_p)))
+            self.__node_depth = np.concatenate((self.__node_depth,
+                                                np.empty_like(self.__node_depth)))
+
+        depth = int(self.__node_depth[parent]) + 1
+        hstep = 1 / self.__depth
+        wstep = 1 / (2 ** (depth + 1))
+        self.__node_coords[n, 0] = self.__node_coords[parent, 0] + (a * 2 - 1) * wstep
+        self.__node_coords[n, 1] = self.__node_coords[parent, 1] + hstep
+        self.__node_p[n] = probability
+        self.__node_depth[n] = depth
+        self.__node_children[parent, a] = n
+        self.__n_nodes = n + 1
+        return n
 
     @staticmethod
     def __step_print(action: int):
@@ -140,86 +208,141 @@ class Renderer:
             print('R', end='')
 
     def __step_draw(self, action: int, probability: float):
-        def update_tree():
-            a = 0 if action == -1 else 1
+        a = 0 if action == -1 else 1
 
-            if self.__cur_node[a] is None:
-                next_depth = self.__cur_node.depth + 1
-                coords2 = self.__cur_node.next_coords(self.__depth, next_depth, a)
-                self.__cur_node[a] = RendererNode(coords2, next_depth, probability)
+        child = int(self.__node_children[self.__cur_node, a])
+        if child == -1:
+            child = self.__add_node(self.__cur_node, a, probability)
 
-            if self.__loss == 'exact_match':
-                self.__cur_reward += np.log(probability)
-            else:
-                self.__cur_reward += probability
-            self.__cur_actions.append(a)
-            self.__cur_node = self.__cur_node[a]
+        if self.__loss == 'exact_match':
+            self.__cur_reward += np.log(probability)
+        else:
+            self.__cur_reward += probability
+        self.__cur_actions.append(a)
+        self.__prev_node = self.__cur_node
+        self.__cur_node = child
 
-        update_tree()
         self.__draw()
 
-    def __draw(self):
-        def update_events():
-            for event in pygame.event.get():
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    self.__is_panning = True
-                    self.mouse_pos = event.pos
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    self.__is_panning = False
-                elif event.type == pygame.MOUSEMOTION:
-                    if self.__is_panning:
-                        for i in range(2):
-                            self.__translation[i] += (event.pos[i] - self.mouse_pos[i])
-                        self.mouse_pos = event.pos
-                elif event.type == pygame.MOUSEWHEEL:
-                    if event.y == 1:
-                        scale2 = self.__scale * self.constants['wheel_sensibility']
-                    else:
-                        scale2 = self.__scale / self.constants['wheel_sensibility']
-                    p = (np.array(pygame.mouse.get_pos(),
-                                  dtype=float) - self.__translation) / self.__scale
-                    self.__translation += (p * (self.__scale - scale2)).astype(int)
-                    self.__scale = scale2
-                elif event.type == pygame.QUIT:
-                    exit()
-                elif event.type == pygame.WINDOWRESIZED:
-                    self.__width = event.x
-                    self.__height = event.y
-
-        def transform(pos):
-            f = 0.9
-            fm = (1 - f) / 2
-            return pos * self.__scale * np.array([f * self.__width, f * self.__height]) +\
-                np.array([fm * self.__width, fm * self.__height]) + self.__translation
-
-        def draw():
-            self.__display.fill(self.colors['background'])
-
-            # DFS drawing tree
-            st = [(self.__root, True)]
-            while len(st) != 0:
-                node, in_best_path = st[-1]
-                st.pop()
-
-                # Draw node
-                if node.id == self.__cur_node.id:
-                    color = Renderer.colors['highlight']
-                elif in_best_path:
-                    color = Renderer.colors['highlight2']
+    def __update_events(self):
+        # One pump then a single bulk drain of the queue; bursts of mouse
+        # motion are coalesced by accumulating the relative movement instead
+        # of handling each intermediate position
+        pygame.event.pump()
+        for event in pygame.event.get(pump=False):
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.__is_panning = True
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self.__is_panning = False
+            elif event.type == pygame.MOUSEMOTION:
+                if self.__is_panning:
+                    self.__translation[0] += event.rel[0]
+                    self.__translation[1] += event.rel[1]
+                    self.__needs_full_redraw = True
+                    self.__view_epoch += 1
+            elif event.type == pygame.MOUSEWHEEL:
+                if event.y == 1:
+                    scale2 = self.__scale * self.constants['wheel_sensibility']
                 else:
-                    color = Renderer.colors['line']
-
-                pygame.draw.circle(self.__display, color, transform(node.coords),
-                                   self.constants['radius'] * self.__scale)
-
+                    scale2 = self.__scale / self.constants['wheel_sensibility']
+                p = (np.array(pygame.mouse.get_pos(),
+                              dtype=float) - self.__translation) / self.__scale
+                self.__translation += (p * (self.__scale - scale2)).astype(int)
+                self.__scale = scale2
+                self.__needs_full_redraw = True
+                self.__view_epoch += 1
+            elif event.type == pygame.QUIT:
+                exit()
+            elif event.type == pygame.WINDOWRESIZED:
+                self.__width = event.x
+                self.__height = event.y
+                self.__needs_full_redraw = True
+                self.__view_epoch += 1
+
+    def __damage_rects(self, screen):
+        # Rects damaged by a plain step: the previous and current node
+        # circles, the edge and label between them, and the reward bar. The
+        # padding covers the node radius and the label around the edge
+        p1 = screen[self.__prev_node]
+        p2 = screen[self.__cur_node]
+        pad = int(max(self.constants['font_size'],
+                      self.constants['radius'] * self.__scale)) + 4
+        step_rect = pygame.Rect(min(p1[0], p2[0]), min(p1[1], p2[1]),
+                                abs(p2[0] - p1[0]) + 1, abs(p2[1] - p1[1]) + 1)
+        bar_rect = pygame.Rect((0, self.__height - self.constants['font_size']),
+                               (self.__width, self.constants['font_size']))
+        return [step_rect.inflate(2 * pad, 2 * pad), bar_rect]
+
+    def __draw_tree(self, screen, region=None):
+        # When a damage region is given, only it is cleared and primitives
+        # away from it are skipped. Drawing is not clipped (clipping changes
+        # how pygame rasterizes lines), so a repainted edge also repaints the
+        # circle of the node it leads to and a repainted circle repaints its
+        # outgoing edges, keeping the full draw's layering
+        if region is None:
+            self.__display.fill(self.colors['background'])
+        else:
+            for rect in region:
+                self.__display.fill(self.colors['background'], rect)
+
+        def touches(rect):
+            return region is None or rect.collidelist(region) != -1
+
+        radius = self.constants['radius'] * self.__scale
+        font_size = self.constants['font_size']
+        children = self.__node_children
+        depths = self.__node_depth
+        probs = self.__node_p
+        cur_node = self.__cur_node
+        best_actions = self.__best_actions
+        # Probability labels are collected during the DFS and blitted in one
+        # batched call instead of one blit per edge
+        text_blits = []
+
+        # DFS drawing tree
+        st = [(0, True, False)]
+        while len(st) != 0:
+            node, in_best_path, forced = st[-1]
+            st.pop()
+
+            # Draw node
+            if node == cur_node:
+                color = Renderer.colors['highlight']
+            elif in_best_path:
+                color = Renderer.colors['highlight2']
+            else:
+                color = Renderer.colors['line']
+
+            p1 = screen[node]
+            circle_drawn = forced or touches(
+                pygame.Rect(p1[0] - radius, p1[1] - radius, 2 * radius, 2 * radius))
+            if circle_drawn:
+                pygame.draw.circle(self.__display, color, p1, radius)
+
+            # Both edges overlap around the node's center, so either all of
+            # the node's edges are repainted or none of them is
+            edges_drawn = circle_drawn
+            if not edges_drawn:
                 for i in range(2):
-                    if node[i] is not None:
-                        in_best_path2 = len(self.__best_actions) == 0 or (
-                                in_best_path and self.__best_actions[node.depth] == i)
-
+                    child = children[node, i]
+                    if child != -1:
+                        p2 = screen[child]
+                        bounds = pygame.Rect(
+                            min(p1[0], p2[0]), min(p1[1], p2[1]),
+                            abs(p2[0] - p1[0]) + 1, abs(p2[1] - p1[1]) + 1)
+                        if touches(bounds.inflate(2 * font_size, 2 * font_size)):
+                            edges_drawn = True
+                            break
+
+            for i in range(2):
+                child = children[node, i]
+                if child != -1:
+                    in_best_path2 = len(best_actions) == 0 or (
+                            in_best_path and best_actions[depths[node]] == i)
+
+                    p2 = screen[child]
+                    if edges_drawn:
                         # Draw line joining nodes
-                        p1 = transform(node.coords)
-                        p2 = transform(node[i].coords)
                         if in_best_path2:
                             color = Renderer.colors['highlight2']
                         else:
@@ -227,33 +350,69 @@ class Renderer:
 
                         pygame.draw.line(self.__display, color, p1, p2, 2)
 
-                        # Draw probability text
-                        text = '{:.1f}'.format(round(node[i].p, 1))
-                        text_blit = self.__font.render(text, False,
-                                                       Renderer.colors['font'])
-                        self.__display.blit(text_blit, (p1 + p2) / 2 - self.constants[
-                            'font_size'] * np.array([0.6, 0.45]))
+                        # Queue probability text
+                        text = '{:.1f}'.format(round(probs[child], 1))
+                        text_blit = self.__text_cache[text]
+                        text_blits.append((text_blit,
+                                           ((p1[0] + p2[0]) / 2 - font_size * 0.6,
+                                            (p1[1] + p2[1]) / 2 - font_size * 0.45)))
+
+                    # Put node in stack
+                    forced2 = edges_drawn and region is not None
+                    if in_best_path2:
+                        st.append((child, True, forced2))
+                    else:
+                        st.append((child, False, forced2))
 
-                        # Put node in stack
-                        if in_best_path2:
-                            st.append((node[i], True))
-                        else:
-                            st.append((node[i], False))
+        if len(text_blits) != 0:
+            self.__display.blits(text_blits, doreturn=0)
 
-            # Bottom bar
+        # Bottom bar
+        rect = pygame.Rect((0, self.__height - font_size),
+                           (self.__width, self.__height))
+        if touches(rect):
             text = 'Current reward: {:.2e}  Best reward: {:.2e}'.format(
                 self.__cur_reward, self.__best_reward)
             text_blit = self.__font.render(text, False, Renderer.colors['font'])
-            rect = pygame.Rect((0, self.__height - self.constants['font_size']),
-                               (self.__width, self.__height))
             pygame.draw.rect(self.__display, self.colors['background'], rect)
             rect = text_blit.get_rect()
             rect.right = self.__width - self.constants['bar_margin']
             rect.bottom = self.__height - self.constants['bar_margin']
             self.__display.blit(text_blit, rect)
 
-        update_events()
-        draw()
-
-        pygame.display.update()
+    def __draw(self):
+        # Pump events at most once per display frame
+        now = time.monotonic()
+        if now - self.__last_pump >= 1. / self.constants['fps']:
+            self.__update_events()
+            self.__last_pump = now
+
+        # Screen coordinates of every node, cached across frames. While the
+        # view is unchanged only nodes added since the last frame are
+        # transformed, in one vectorized call
+        f = 0.9
+        fm = (1 - f) / 2
+        n = self.__n_nodes
+        if self.__screen_epoch != self.__view_epoch:
+            self.__screen = []
+            self.__screen_epoch = self.__view_epoch
+        start = len(self.__screen)
+        if start < n:
+            self.__screen.extend(
+                (self.__node_coords[start:n] * self.__scale *
+                 np.array([f * self.__width, f * self.__height]) +
+                 np.array([fm * self.__width, fm * self.__height]) +
+                 self.__translation).tolist())
+        screen = self.__screen
+
+        if self.__needs_full_redraw or self.__prev_node is None:
+            self.__draw_tree(screen)
+            pygame.display.update()
+            self.__needs_full_redraw = False
+        else:
+            # Repaint around the damage and flip only those rects instead of
+            # the whole screen
+            rects = self.__damage_rects(screen)
+            self.__draw_tree(screen, rects)
+            pygame.display.update(rects)
         self.__clock.tick(self.constants['fps'])
@@ -13,6 +13,9 @@ class QAgent(Agent):
     """
     Reinforcement learning agent that uses only Q-learning to find the best tree path.
     """
+    # Maximum number of experienced states kept for training; older ones are
+    # overwritten first
+    experience_buffer_size = 100000
 
     def __init__(self, environment: Env):
         super().__init__(environment)
@@ -24,6 +27,17 @@ class QAgent(Agent):
         self.n_visited_nodes = 0
         self.node_to_best_final_value = {}
 
+        # Ring buffers holding the experienced states, so the training set is
+        # flat tensors with bounded memory instead of an ever-growing chain of
+        # ConcatDatasets
+        depth = environment.classifier_chain.n_labels
+        capacity = QAgent.experience_buffer_size
+        self.__buf_actions = torch.empty((capacity, depth), dtype=torch.int8)
+        self.__buf_probas = torch.empty((capacity, depth))
+        self.__buf_values = torch.empty(capacity)
+        self.__buf_write = 0
+        self.__buf_len = 0
+
     def train(self, nb_sim: int, nb_paths: int, epochs: int, batch_size: int = 64,
               learning_rate: float = 1e-2, verbose: bool = False):
         """
@@ -100,19 +114,28 @@ class QAgent(Agent):
             self.__experience_environment_once(actions_history, probas_history,
                                                final_values, exploring_p=exploring_p)
 
-        # Updating data loader to train the network
-        actions_history = torch.tensor(actions_history).float()
-        probas_history = torch.tensor(probas_history).float()
+        # Updating data loader to train the network. Actions stay int8, a
+        # quarter of the float bandwidth; the model casts them at its input
+        actions_history = torch.tensor(np.array(actions_history))
+        probas_history = torch.tensor(np.array(probas_history)).float()
         final_values = torch.tensor(final_values).float()
 
-        # TODO: put a limit in the size of the dataset
-        new_data = data.TensorDataset(actions_history, probas_history, final_values)
-        if self.dataset is None:
-            self.dataset = new_data
-        else:
-            self.dataset = data.ConcatDataset([self.dataset, new_data])
+        # Write the new experiences into the ring buffers
+        capacity = QAgent.experience_buffer_size
+        idx = (self.__buf_write + torch.arange(len(final_values))) % capacity
+        self.__buf_actions[idx] = actions_history
+        self.__buf_probas[idx] = probas_history
+        self.__buf_values[idx] = final_values
+        self.__buf_write = (self.__buf_write + len(final_values)) % capacity
+        self.__buf_len = min(self.__buf_len + len(final_values), capacity)
+
+        self.dataset = data.TensorDataset(self.__buf_actions[:self.__buf_len],
+                                          self.__buf_probas[:self.__buf_len],
+                                          self.__buf_values[:self.__buf_len])
+        # Pinned memory lets the per-batch copies to the GPU run asynchronously
         self.data_loader = data.DataLoader(self.dataset, batch_size=batch_size,
-                                           shuffle=True)
+                                           shuffle=True,
+                                           pin_memory=self.device.type == 'cuda')
 
     def __train_once(self, epochs: int, optimizer: torch.optim.Optimizer,
                      loss_fn: Callable[[Tensor, Tensor], Tensor], verbose: bool):
@@ -127,9 +150,11 @@ class QAgent(Agent):
         self.model.train()
 
         for epoch in range(epochs):
-            for i, data in enumerate(self.data_loader):
-                actions_history, probas_history, final_values = \
-                    [d.to(self.device) for d in data]
+            for i, batch in enumerate(self.data_loader):
+                actions_history, probas_history, final_values = batch
+                actions_history = actions_history.to(self.device, non_blocking=True)
+                probas_history = probas_history.to(self.device, non_blocking=True)
+                final_values = final_values.to(self.device, non_blocking=True)
 
                 optimizer.zero_grad()
 
@@ -158,28 +183,45 @@ class QAgent(Agent):
         # Get current state from environment
         next_proba, action_history, proba_history = self.environment.reset()
 
-        # Record the nodes in the current path
+        # Record the nodes in the current path. Nodes are identified by their
+        # depth and the bitstring of actions leading to them, folded into one
+        # int, which hashes much faster than a tuple of the action history
         nodes_current_path = []
+        node_key = 0
+
+        # Persistent tensor state of this path, filled in place after each step
+        # instead of materializing a new tensor from the whole history every
+        # time the model chooses an action
+        actions_t = torch.zeros(depth, dtype=torch.int8)
+        probas_t = torch.zeros(depth)
+
+        # All random exploration decisions of this path, drawn in two vectorized
+        # calls instead of one numpy call per step. Nothing is drawn when
+        # exploration is off, as in the final prediction pass
+        exploring = exploring_p > 0
+        if exploring:
+            rs = np.random.random(depth)
+            ra = np.random.randint(0, 2, depth) * 2 - 1
 
         for j in range(depth):
-            r = np.random.rand()
-            if r < exploring_p:
+            if exploring and rs[j] < exploring_p:
                 # Add randomness to make agent explore more
-                next_action = np.random.randint(0, 2) * 2 - 1
+                next_action = int(ra[j])
             else:
                 # Choosing the next action using the agent
-                next_action = self.model.choose_action(
-                    torch.tensor(action_history).float(),
-                    torch.tensor(proba_history).float(),
-                    next_proba, j)
+                next_action = self.model.choose_action(actions_t, probas_t,
+                                                       next_proba, j)
 
             # Get next state
             next_proba, action_history, proba_history, final_value, end = \
                 self.environment.step(next_action)
             self.n_visited_nodes += 1
+            actions_t[j] = next_action
+            probas_t[j] = float(proba_history[j])
 
             # Adding past actions to the history
-            nodes_current_path += [tuple(action_history)]
+            node_key = (node_key << 1) | (next_action == 1)
+            nodes_current_path += [((j + 1) << 32) | node_key]
             actions_history += [action_history]
             probas_history += [proba_history]
 
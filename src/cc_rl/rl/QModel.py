@@ -1,7 +1,7 @@
-import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import warnings
 
 
 class QModel(nn.Module):
@@ -14,23 +14,40 @@ class QModel(nn.Module):
         self.output = nn.Linear(h_size // 2, 1)
 
         self.to(device)
+        # There are no train-mode layers in this model, so it can stay in eval
+        # mode permanently instead of toggling on every action choice
+        self.eval()
+
+        # For an MLP this small the dispatcher overhead dominates the FLOPs, so
+        # choose_action goes through a jitted forward graph. The trace shares
+        # the parameter tensors, so training updates are picked up. Newer torch
+        # versions deprecate tracing in favor of torch.compile, whose compile
+        # time is far too long for one model per sample
+        example_actions = torch.zeros((2, tree_height - 1), dtype=torch.int8,
+                                      device=device)
+        example_probas = torch.zeros((2, tree_height - 1), device=device)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            self.traced_forward = torch.jit.trace(self.forward,
+                                                  (example_actions, example_probas))
 
+    @torch.inference_mode()
     def choose_action(self, actions, probabilities, next_p, depth):
-        self.eval()
         actions = actions.reshape(1, -1).to(self.device)
         probabilities = probabilities.reshape(1, -1).to(self.device)
-        with torch.no_grad():
-            probabilities[0, depth] = next_p
+        probabilities[0, depth] = next_p
 
-            values = []
-            actions[0, depth] = -1
-            values.append(self.forward(actions, probabilities))
-            actions[0, depth] = 1
-            values.append(self.forward(actions, probabilities))
-        return 2 * np.argmax(values) - 1
+        # Score both branches in a single batched forward pass
+        actions = actions.repeat(2, 1)
+        actions[0, depth] = -1
+        actions[1, depth] = 1
+        values = self.traced_forward(actions, probabilities.expand(2, -1))
+        # Direct comparison of the two values; ties keep argmax's choice of -1
+        return int(values[1] > values[0]) * 2 - 1
 
     def forward(self, actions, probabilities):
-        inp = torch.cat((actions, probabilities), 1)
+        # Actions travel as int8 and only become floats at the model input
+        inp = torch.cat((actions.to(torch.float32), probabilities), 1)
         h = F.relu(self.h1(inp))
         out = self.output(h)
         return out
@@ -4,6 +4,9 @@ def multilabel_accuracy(y_true, y_pred):
     """Calculates accuracy as described here
     https://stackoverflow.com/questions/32239577/getting-the-accuracy-for-multi-label-prediction-in-scikit-learn
 
+    Computed as a vectorized Jaccard score over boolean arrays, where rows with no
+    true and no predicted labels count as 1.
+
     Args:
         y_true (np.array): Ground truth (correct) labels.
         y_pred (np.array): Predicted labels, as returned by a classifier.
@@ -11,15 +14,9 @@ def multilabel_accuracy(y_true, y_pred):
     Returns:
         float: Accuracy value, between 0 and 1.
     """
-    acc_list = []
-    for i in range(y_true.shape[0]):
-        set_true = set(np.where(y_true[i])[0] )
-        set_pred = set(np.where(y_pred[i])[0] )
-        tmp_a = None
-        if len(set_true) == 0 and len(set_pred) == 0:
-            tmp_a = 1
-        else:
-            tmp_a = len(set_true.intersection(set_pred))/\
-                    float( len(set_true.union(set_pred)) )
-        acc_list.append(tmp_a)
-    return np.mean(acc_list)
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+    intersection = np.logical_and(y_true, y_pred).sum(axis=1)
+    union = np.logical_or(y_true, y_pred).sum(axis=1)
+    acc = np.where(union == 0, 1.0, intersection / np.maximum(union, 1))
+    return acc.mean()
@@ -2,11 +2,20 @@ from cc_rl.classifier_chain.ClassifierChain import ClassifierChain
 from cc_rl.data.Dataset import Dataset
 from cc_rl.gym_cc.Env import Env
 
-dataset = Dataset('emotions')
-cc = ClassifierChain()
-cc.fit(dataset)
-env = Env(cc, dataset.test_x, display='draw')
-print(env.reset())
-steps = [1, 1, -1, 1, 1, -1]
-for i in range(6):
-    print(env.step(steps[i]))
\ No newline at end of file
+
+def main():
+    dataset = Dataset('emotions')
+    cc = ClassifierChain()
+    cc.fit(dataset)
+    env = Env(cc, dataset.test_x, display='draw')
+
+    # Batch everything into a single print instead of flushing stdout per step
+    results = [env.reset()]
+    steps = [1, 1, -1, 1, 1, -1]
+    for i in range(6):
+        results.append(env.step(steps[i]))
+    print('\n'.join(map(str, results)))
+
+
+if __name__ == '__main__':
+    main()